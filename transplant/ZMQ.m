@@ -5,8 +5,8 @@
 % to the socket.
 %
 % ZMQ Methods:
-%   receive - read a message from the socket
-%   send    - write a message to the socket
+%   receive - read a (multipart) message from the socket
+%   send    - write a (multipart) message to the socket
 
 % Copyright (c) 2016, Bastian Bechtold
 % This code is published under the terms of the BSD 3-clause license
@@ -42,26 +42,45 @@ classdef ZMQ < handle
             end
         end
 
-        function str = receive(obj)
-            msg = libstruct('zmq_msg_t', struct('hidden', zeros(1, 64, 'uint8')));
-            calllib('libzmq', 'zmq_msg_init', msg); % always returns 0
-            msglen = calllib('libzmq', 'zmq_msg_recv', msg, obj.socket, 0);
-            assert(msglen >= 0, obj.errortext('zmq_msg_recv'));
-            msgptr = calllib('libzmq', 'zmq_msg_data', msg);
-            if not(msgptr.isNull)
-                setdatatype(msgptr, 'uint8Ptr', 1, msglen);
-                str = uint8(msgptr.Value);
-            else
-                str = uint8([]);
+        % Receive all frames of a message as a cell array of uint8 arrays
+        function frames = receive(obj)
+            frames = {};
+            more = true;
+            while more
+                msg = libstruct('zmq_msg_t', struct('hidden', zeros(1, 64, 'uint8')));
+                calllib('libzmq', 'zmq_msg_init', msg); % always returns 0
+                msglen = calllib('libzmq', 'zmq_msg_recv', msg, obj.socket, 0);
+                assert(msglen >= 0, obj.errortext('zmq_msg_recv'));
+                msgptr = calllib('libzmq', 'zmq_msg_data', msg);
+                if not(msgptr.isNull)
+                    setdatatype(msgptr, 'uint8Ptr', 1, msglen);
+                    frames{end+1} = uint8(msgptr.Value);
+                else
+                    frames{end+1} = uint8([]);
+                end
+                % more frames of the same message will follow:
+                more = calllib('libzmq', 'zmq_msg_more', msg);
+                err = calllib('libzmq', 'zmq_msg_close', msg);
+                assert(err == 0, obj.errortext('zmq_msg_close'));
             end
-            err = calllib('libzmq', 'zmq_msg_close', msg);
-            assert(err == 0, obj.errortext('zmq_msg_close'));
         end
 
-        function send(obj, data)
-            dataptr = libpointer('uint8Ptr', data);
-            msglen = calllib('libzmq', 'zmq_send', obj.socket, dataptr, numel(data), 0);
-            assert(msglen >= 0, obj.errortext('zmq_send'));
+        % Send a uint8 array, or a cell array of uint8 arrays as the
+        % frames of a multipart message
+        function send(obj, frames)
+            ZMQ_SNDMORE = 2;
+            if not(iscell(frames))
+                frames = {frames};
+            end
+            for n=1:length(frames)
+                % all but the last frame announce more frames:
+                flags = ZMQ_SNDMORE * (n < length(frames));
+                % hand the array directly to zmq_send instead of
+                % wrapping it in a libpointer, which would copy it once
+                % more before zmq copies it into its message:
+                msglen = calllib('libzmq', 'zmq_send', obj.socket, frames{n}, numel(frames{n}), flags);
+                assert(msglen >= 0, obj.errortext('zmq_send'));
+            end
         end
 
         function delete(obj)
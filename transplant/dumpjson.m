@@ -2,7 +2,8 @@
 % DUMPJSON(DATA)
 %    recursively walks through DATA and creates a JSON string from it.
 %    - strings are converted to strings with escape sequences
-%    - scalars are converted to numbers
+%    - scalars are converted to numbers, NaN and Inf to NaN and
+%      Infinity (as read by Python)
 %    - logicals are converted to `true` and `false`
 %    - arrays are converted to arrays of numbers
 %    - matrices are converted to arrays of arrays of numbers
@@ -86,6 +87,10 @@ end
 function [json] = number(data)
     if isinteger(data)
         json = sprintf('%i', data);
+    elseif isinf(data) && data > 0
+        json = 'Infinity';
+    elseif isinf(data)
+        json = '-Infinity';
     else
         json = sprintf('%.50g', data);
     end
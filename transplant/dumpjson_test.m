@@ -18,6 +18,12 @@ if ~strcmp('-12300', dumpjson(-1.23e4))
     error('Number dumping failed')
 end
 
+%% Non-finite number dumping
+if ~strcmp('NaN', dumpjson(NaN)) || ~strcmp('Infinity', dumpjson(Inf)) || ...
+   ~strcmp('-Infinity', dumpjson(-Inf))
+    error('Non-finite number dumping failed')
+end
+
 %% Bool dumping
 if ~strcmp('true', dumpjson(true))
     error('Boolean dumping failed')
@@ -4,6 +4,8 @@
 %    from it.
 %    - strings are converted to strings with escape sequences removed
 %    - numbers are converted to doubles
+%    - NaN, Infinity, -Infinity (as written by Python) are converted to
+%      NaN, Inf, -Inf
 %    - true, false are converted to logical 1, 0
 %    - null is converted to []
 %    - arrays are converted to cell arrays
@@ -44,6 +46,9 @@ function [obj, idx] = value(json, idx, tokens)
     char = json(idx);
     if char == '"'
         [obj, idx] = string(json, idx, tokens);
+    elseif char == 'N' || char == 'I' || ...
+           (char == '-' && idx < length(json) && json(idx+1) == 'I')
+        [obj, idx] = nonfinite(json, idx, tokens);
     elseif any(char == '0123456789-')
         [obj, idx] = number(json, idx, tokens);
     elseif char == '{'
@@ -86,7 +91,7 @@ function tokens = tokenize(s)
     % but backslashes or quotes.
     strings = '"[^"\\]*(?:\\.[^"\\]*)*"';
     punctuation = '[\s{}\[\]=:,]+';
-    keywords = '(true|false|null)';
+    keywords = '(true|false|null|NaN|-?Infinity)';
     numbers = '[-+0-9.eE]+';
     everything = ['(' strings ')|(?>' punctuation ')|(?>' keywords ')|(' numbers ')'];
     [start, stop] = regexp(s, everything);
@@ -137,6 +142,24 @@ function [obj, idx] = number(json, idx, tokens)
     idx = stop+1;
 end
 
+% parses NaN, Infinity, or -Infinity and advances idx
+function [obj, idx] = nonfinite(json, idx, tokens)
+    stop = tokens(idx);
+    switch json(idx:stop)
+        case 'NaN'
+            obj = NaN;
+        case 'Infinity'
+            obj = Inf;
+        case '-Infinity'
+            obj = -Inf;
+        otherwise
+            error('JSON:parse:nonfinite:nononfinite', ...
+                  ['not a non-finite number: "' json(idx:stop) ...
+                   '" (char ' num2str(idx) ')']);
+    end
+    idx = stop+1;
+end
+
 % parses an object and advances idx
 function [obj, idx] = object(json, idx, tokens)
     start = idx;
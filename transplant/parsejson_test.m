@@ -18,6 +18,12 @@ if parsejson('-12.34e56') ~= -12.34e56
     error('Number parsing failed')
 end
 
+%% Non-finite number parsing
+if ~isnan(parsejson('NaN')) || parsejson('Infinity') ~= Inf || ...
+   parsejson('-Infinity') ~= -Inf
+    error('Non-finite number parsing failed')
+end
+
 %% Bool parsing
 bool = parsejson('true');
 if bool ~= true || ~islogical(bool)
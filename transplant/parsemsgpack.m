@@ -8,6 +8,8 @@
 %    - nil is converted to []
 %    - arrays are converted to cell arrays
 %    - maps are converted to containers.Map
+%    - bins are converted to uint8 arrays
+%    - exts are converted to structs with fields 'type' and 'data'
 
 % (c) 2016 Bastian Bechtold
 % This code is licensed under the BSD 3-clause license
@@ -82,7 +84,7 @@ function [obj, idx] = parse(bytes, idx)
             [obj, idx] = parsebytes(len, bytes, idx+5);
         case 199 % ext8
             len = double(bytes(idx+1));
-            [obj, idx] = parseext(len, bytes, idx+1);
+            [obj, idx] = parseext(len, bytes, idx+2);
         case 200 % ext16
             len = double(bytes2scalar(bytes(idx+1:idx+2), 'uint16'));
             [obj, idx] = parseext(len, bytes, idx+3);
@@ -172,8 +174,8 @@ function [out, idx] = parsebytes(len, bytes, idx)
 end
 
 function [out, idx] = parseext(len, bytes, idx)
-    obj.type = bytes(idx);
-    obj.data = bytes(idx+1:idx+len);
+    out.type = typecast(bytes(idx), 'int8');
+    out.data = bytes(idx+1:idx+len);
     idx = idx + len + 1;
 end
 
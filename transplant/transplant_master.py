@@ -7,18 +7,63 @@ import tempfile
 from glob import glob
 import zmq
 import numpy as np
-import base64
-from threading import Thread
+import codecs
+import json
+import linecache
+from threading import Thread, current_thread
+from concurrent.futures import ThreadPoolExecutor
 import msgpack
 import ctypes.util
+from contextlib import contextmanager
+from functools import partial
 
 try:
-    from scipy.sparse import spmatrix as sparse_matrix
+    from scipy.sparse import spmatrix as sparse_matrix, coo_matrix
 except ImportError:
     # this will fool the `isinstance(data, sparse_matrix)` in
     # `_encode_values` to never trigger in case scipy.sparse is not
     # installed:
     sparse_matrix = tuple()
+    coo_matrix = None
+
+try:
+    # msgspec packs and unpacks msgpack faster than msgpack itself, and
+    # is used instead if it is installed:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    # orjson parses JSON much faster than json, and is used for JSON
+    # responses if it is installed. Messages are still written with
+    # json, since orjson would write NaN and Inf as null:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # pybase64 is a faster drop-in replacement for base64, which
+    # encodes matrices in JSON messages:
+    import pybase64 as base64
+    b64encode_as_string = base64.b64encode_as_string
+    b64decode_as_bytearray = base64.b64decode_as_bytearray
+except ImportError:
+    import base64
+    def b64encode_as_string(s):
+        return base64.b64encode(s).decode()
+    def b64decode_as_bytearray(s):
+        return bytearray(base64.b64decode(s))
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8 can't share memory with Matlab, and sends all
+    # matrices through 0MQ instead:
+    shared_memory = None
+
+# values of these exact types are transmitted as they are, and can skip
+# the type checks in `_encode_values` and `_decode_values`:
+primitive_types = frozenset([str, bytes, int, float, bool, type(None)])
 
 
 """Transplant is a Python client for remote code execution
@@ -32,8 +77,8 @@ All basic data types are passed by value, and Matlab matrices are
 converted to Numpy arrays and vice versa.
 
 It can start and connect Matlab servers and send them messages. All
-messages are JSON-encoded strings. All messages are dictionaries with
-at least one key: 'type'.
+messages are Msgpack-encoded or JSON-encoded objects. All messages are
+dictionaries with at least one key: 'type'.
 
 Depending on the message type, other keys may or may not be set.
 
@@ -43,6 +88,8 @@ There are seven request types sent by Python:
 - 'get_global': retrieves the value of a global variable 'name'.
 - 'del_proxy': remove cached object 'handle'.
 - 'call': call function 'name' with 'args' and 'nargout'.
+- 'batch': handle a list of 'messages' in order, and return a list of
+  their responses as 'value'.
 
 There are three response types:
 - 'ack': the server received the message successfully.
@@ -67,6 +114,27 @@ class TransplantError(RuntimeError):
         self.identifier = identifier
         self.original_message = original_message
 
+    def __str__(self):
+        """Format the message and a pretty backtrace almost like Python's.
+
+        The backtrace is only created when needed, since many errors
+        (e.g. in `Matlab.__getattr__`) are caught and never shown.
+
+        """
+        trace = 'Traceback (most recent call last):\n'
+        for frame in reversed(self.stack):
+            trace += '  File "{file}", line {line:.0f}, in {name}\n'.format(**frame)
+            if frame['file'] is not None and frame['file'].endswith('.m'):
+                # The .m file might have been edited since it was
+                # cached:
+                linecache.checkcache(frame['file'])
+                # linecache returns '' for missing files or lines, e.g.
+                # of a remote Matlab:
+                source = linecache.getline(frame['file'], int(frame['line'])).strip()
+                if source:
+                    trace += '    ' + source + '\n'
+        return super(TransplantError, self).__str__() + trace
+
 
 class TransplantMaster:
     """Base class for Transplant Master objects.
@@ -79,6 +147,33 @@ class TransplantMaster:
     """
 
     ProxyObject = None
+    # decoders of special lists by their tag, and their valid lengths:
+    _decoders = {"__matrix__": ((4, 5), '_decode_matrix'),
+                 "__sparse__": ((5,), '_decode_sparse_matrix'),
+                 "__object__": ((2,), '_decode_proxy'),
+                 "__function__": ((2,), '_decode_function')}
+    # messages queued by `batch`, or None if no batch is active:
+    _batch = None
+    # number of the last request sent, used to match responses:
+    _request_id = 0
+    # matrices of at least this many bytes are sent through shared
+    # memory, or None to always send them through 0MQ:
+    _shm_threshold = None
+    # shared memory blocks of the current message:
+    _shared_memory = ()
+    # dtypes that are converted to other dtypes before sending:
+    _downcast = {}
+    # the executor and its thread for `_call_async`, or None:
+    _executor = None
+    _worker = None
+    # handles of released proxy objects, see `_del_proxy`:
+    _released_proxies = ()
+    # attributes stored on the instance, not as remote variables:
+    _attributes = frozenset([
+        'ipcfile', 'context', 'socket', 'process', 'msgformat', '_frames',
+        '_batch', '_batch_results', '_functions', '_request_id',
+        '_shm_threshold', '_shared_memory', '_pack', '_unpack', '_downcast',
+        '_executor', '_worker', '_help_texts', '_released_proxies'])
 
     def __init__(self, address):
         pass
@@ -93,38 +188,140 @@ class TransplantMaster:
         return response['value']
 
     def _del_proxy(self, handle):
-        """Tell the remote to forget about this proxy object."""
+        """Tell the remote to forget about this proxy object.
+
+        The handle is only queued, and sent together with all other
+        released handles before the next message (see `send_message`).
+
+        """
         # ignore if remote already shut down:
         if self.socket.closed:
             return
-        self.send_message('del_proxy', handle=handle)
+        if not self._released_proxies:
+            self._released_proxies = []
+        self._released_proxies.append(handle)
 
     def __getattr__(self, name):
         """Retrieve a value or function from the remote."""
+        # not set yet, e.g. if the constructor failed:
+        if name in self._attributes:
+            raise AttributeError(name)
         return self._get_global(name)
 
     def __setattr__(self, name, value):
         """Retrieve a value or function from the remote."""
-        if name in ['ipcfile', 'context', 'socket', 'process', 'msgformat']:
+        if name in self._attributes:
             self.__dict__[name] = value
         else:
             self._set_global(name, value)
 
-    def _call(self, name, args=[], kwargs=[]):
+    def _call(self, name, args=(), kwargs=None):
         """Call a function on the remote."""
-        args = list(args)
-        kwargs = dict(kwargs)
+        if kwargs is None:
+            kwargs = {}
         response = self.send_message('call', name=name, args=args, kwargs=kwargs)
         if response['type'] == 'value':
             return response['value']
 
+    def _call_async(self, name, args=(), kwargs=None):
+        """Call a function on the remote in the background."""
+        self._check_not_batching()
+        self._start_executor()
+        return self._executor.submit(self._call, name, args, kwargs)
+
+    def _check_not_batching(self):
+        """Raise an error for asynchronous calls within a batch.
+
+        The call would be queued, and its future would resolve to
+        `None` instead of the result.
+
+        """
+        if self._batch is not None:
+            raise RuntimeError('asynchronous calls can not be batched')
+
+    def _start_executor(self):
+        """Start the background thread for asynchronous calls.
+
+        0MQ sockets must not be used from more than one thread. Once
+        the executor is running, all messages are therefore sent from
+        its single worker thread (see `send_message`).
+
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+            self._worker = self._executor.submit(current_thread).result()
+
+    @contextmanager
+    def batch(self):
+        """Send several requests in a single round-trip.
+
+        Within the `with` block, assignments and function calls are
+        not sent immediately, but queued and sent together at the end
+        of the block. They return `None` instead of their result, and
+        their results are appended to the list returned by the
+        context manager instead, one entry per queued request:
+
+        >>> plus = matlab.plus
+        >>> with matlab.batch() as results:
+        ...     matlab.x = 1
+        ...     plus(2, 3)
+        >>> results
+        [None, 5.0]
+
+        Any other request (e.g. retrieving a variable) sends the
+        queued requests first. Arrays must not be changed until the
+        queued requests have been sent. The first error aborts the
+        batch, and is raised as usual. Asynchronous calls (see
+        `MatlabFunction.call_async`) are not allowed within a batch.
+
+        """
+        if self._batch is not None:
+            # already batching, results go to the outer batch:
+            yield self._batch_results
+            return
+        if self._executor is not None:
+            # asynchronous calls from before the batch are not batched:
+            self._executor.submit(lambda: None).result()
+        self._batch_results = []
+        self._batch = []
+        try:
+            yield self._batch_results
+            self._send_batch()
+        finally:
+            self._batch = None
+
+    def get_many(self, *names):
+        """Retrieve several values in a single round-trip.
+
+        >>> x, y = matlab.get_many('x', 'y')
+
+        is equivalent to ``x, y = matlab.x, matlab.y``, but asks
+        Matlab for all values at once.
+
+        """
+        messages = [dict(type='get_global', name=name) for name in names]
+        response = self.send_message('batch', messages=messages)
+        return tuple(r['value'] for r in response['value'])
+
+    def _send_batch(self):
+        """Send all messages queued by `batch` as one 'batch' message."""
+        messages, self._batch = self._batch, None
+        if messages:
+            response = self.send_message('batch', messages=messages)
+            self._batch_results.extend(r.get('value') for r in response['value'])
+        self._batch = []
+
     def _start_reader(self):
         """Starts an asynchronous reader that echos everything the remote says"""
         stdout = self.process.stdout
         def reader():
             """Echo what the remote says using print"""
-            for line in iter(stdout.readline, bytes()):
-                print(line.decode(), end='')
+            # read whatever is available instead of line by line. The
+            # incremental decoder keeps multibyte characters intact if
+            # they are split between chunks:
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            for chunk in iter(partial(os.read, stdout.fileno(), 65536), bytes()):
+                print(decoder.decode(chunk), end='', flush=True)
         Thread(target=reader, daemon=True).start()
 
     def __enter__(self):
@@ -142,38 +339,121 @@ class TransplantMaster:
 
     def __del__(self):
         """Close the connection, and kill the process."""
-        self.exit()
+        # nothing to close if the constructor failed before starting it:
+        if 'process' in self.__dict__:
+            self.exit()
 
     def send_message(self, msg_type, **kwargs):
-        """Send a message and return the response"""
-        kwargs = self._encode_values(kwargs)
+        """Send a message and return the response
+
+        In Msgpack, matrix contents are not embedded in the message,
+        but sent as additional frames of a multipart message (see
+        `_encode_matrix`). These frames reference the Numpy buffers
+        directly, without copying them.
+
+        During a `batch`, 'set_global' and 'call' messages are only
+        queued, and acknowledged immediately. Other messages send the
+        queued messages first.
+
+        Every message is preceded by its request ID and an empty
+        delimiter frame. The remote echoes these frames back with its
+        response, which identifies responses to earlier, interrupted
+        requests. These are discarded.
+
+        Shared memory blocks of big matrices (see `_encode_matrix`) are
+        released once the response has arrived, or, if the request was
+        interrupted, at the beginning of the next message.
+
+        After the first asynchronous call, messages are sent from the
+        executor's worker thread, and wait for all earlier
+        asynchronous calls to finish.
 
-        self._wait_socket(zmq.POLLOUT)
+        Proxy objects released since the last message are deleted in
+        the remote in a single batch before the message is sent.
+
+        """
+        if self._executor is not None and current_thread() is not self._worker:
+            future = self._executor.submit(self.send_message, msg_type, **kwargs)
+            return future.result()
+
+        # kwargs is a fresh dict, and can become the message itself:
+        kwargs['type'] = msg_type
+        if self._batch is not None:
+            if msg_type in ('set_global', 'call'):
+                self._batch.append(kwargs)
+                return {'type': 'ack'}
+            self._send_batch()
+
+        if self._released_proxies and msg_type != 'die':
+            handles, self._released_proxies = self._released_proxies, []
+            self.send_message('batch', messages=[dict(type='del_proxy', handle=handle)
+                                                 for handle in handles])
+
+        self._release_shared_memory()
+        # the first frame is reserved for the message itself:
+        self._frames = [None]
+        message = self._encode_values(kwargs)
+
+        self._request_id += 1
+        request_id = self._request_id.to_bytes(8, 'little')
         if self.msgformat == 'msgpack':
-            self.socket.send(msgpack.packb(dict(kwargs, type=msg_type), use_bin_type=True), flags=zmq.NOBLOCK)
+            self._frames[0] = self._pack(message)
         else:
-            self.socket.send_json(dict(kwargs, type=msg_type), flags=zmq.NOBLOCK)
+            self._frames[0] = json.dumps(message).encode()
+        frames = [request_id, b''] + self._frames
+        try:
+            # the socket is almost always ready, so only wait if it isn't:
+            self.socket.send_multipart(frames, flags=zmq.NOBLOCK, copy=False)
+        except zmq.Again:
+            self._wait_socket(zmq.POLLOUT)
+            self.socket.send_multipart(frames, flags=zmq.NOBLOCK, copy=False)
 
-        self._wait_socket(zmq.POLLIN)
+        while True:
+            # the receive times out every second (see `Matlab.__init__`),
+            # to check whether the process is still alive:
+            try:
+                frames = self.socket.recv_multipart(copy=False)
+            except zmq.Again:
+                if self.process.poll() is not None:
+                    raise RuntimeError('Process died unexpectedly')
+                continue
+            if frames[0].bytes == request_id:
+                break
+        self._release_shared_memory()
+        # strip request ID and delimiter:
+        self._frames = frames[2:]
         if self.msgformat == 'msgpack':
-            response = msgpack.unpackb(self.socket.recv(flags=zmq.NOBLOCK), raw=False, max_bin_len=2**31-1)
+            response = self._unpack(self._frames[0].buffer)
+        elif orjson is not None:
+            try:
+                response = orjson.loads(self._frames[0].buffer)
+            except orjson.JSONDecodeError:
+                # Matlab writes NaN as a bare `NaN`, which only json
+                # accepts:
+                response = json.loads(self._frames[0].bytes.decode())
         else:
-            response = self.socket.recv_json(flags=zmq.NOBLOCK)
+            response = json.loads(self._frames[0].bytes.decode())
 
-        response = self._decode_values(response)
+        # only values can contain special entries, acknowledgements and
+        # errors don't need to be decoded:
+        if response['type'] == 'value':
+            response['value'] = self._decode_values(response['value'])
+        # decoded matrices keep their own references to their frames:
+        self._frames = None
         if response['type'] == 'error':
-            # Create a pretty backtrace almost like Python's:
-            trace = 'Traceback (most recent call last):\n'
             if isinstance(response['stack'], dict):
                 response['stack'] = [response['stack']]
-            for frame in reversed(response['stack']):
-                trace += '  File "{file}", line {line:.0f}, in {name}\n'.format(**frame)
-                if frame['file'] is not None and os.path.exists(frame['file']) and frame['file'].endswith('.m'):
-                    trace += '    ' + open(frame['file'], 'r', errors='replace').readlines()[int(frame['line'])-1].strip(' ')
-            raise TransplantError('{message} ({identifier})\n'.format(**response) + trace,
-                              response['stack'], response['identifier'], response['message'])
+            raise TransplantError('{message} ({identifier})\n'.format(**response),
+                                  response['stack'], response['identifier'], response['message'])
         return response
 
+    def _release_shared_memory(self):
+        """Free all shared memory blocks of the last message."""
+        for shm in self._shared_memory:
+            shm.close()
+            shm.unlink()
+        self._shared_memory = []
+
     def _wait_socket(self, flags, timeout=1000):
         """Wait for socket or crashed process."""
         while True:
@@ -184,7 +464,18 @@ class TransplantMaster:
 
     def _encode_values(self, data):
         """Recursively walk through data and encode special entries."""
-        if isinstance(data, (np.ndarray, np.number)):
+        # exact type checks are much faster than `isinstance`, so the
+        # most common types are checked that way first:
+        data_type = type(data)
+        if data_type in primitive_types:
+            return data
+        elif data_type is np.ndarray:
+            return self._encode_matrix(data)
+        elif data_type is list or data_type is tuple:
+            return self._encode_sequence(data)
+        elif data_type is dict:
+            return self._encode_mapping(data)
+        elif isinstance(data, (np.ndarray, np.number)):
             return self._encode_matrix(data)
         elif isinstance(data, complex):
             # encode python complex numbers as scalar numpy arrays
@@ -202,87 +493,175 @@ class TransplantMaster:
         elif isinstance(data, MatlabFunction):
             out = ["__function__", data._fun]
         elif isinstance(data, dict):
-            out = {}
-            for key in data:
-                out[key] = self._encode_values(data[key])
+            out = self._encode_mapping(data)
         elif isinstance(data, list) or isinstance(data, tuple):
-            out = list(data)
-            for idx in range(len(data)):
-                out[idx] = self._encode_values(data[idx])
+            out = self._encode_sequence(data)
         else:
             out = data
         return out
 
-    def _decode_values(self, data):
-        """Recursively walk through data and decode special entries."""
-        if (isinstance(data, list) and
-            len(data) == 4 and
-            data[0] == "__matrix__"):
-            return self._decode_matrix(data)
-        elif (isinstance(data, list) and
-            len(data) == 5 and
-            data[0] == "__sparse__"):
-            return self._decode_sparse_matrix(data)
-        elif (isinstance(data, list) and
-            len(data) == 2 and
-            data[0] == "__object__"):
-            return self._decode_proxy(data)
-        elif (isinstance(data, list) and
-            len(data) == 2 and
-            data[0] == "__function__"):
-            return self._decode_function(data)
-        elif isinstance(data, dict):
-            out = {}
-            for key in data:
-                out[key] = self._decode_values(data[key])
-        elif isinstance(data, list) or isinstance(data, tuple):
-            out = list(data)
-            for idx in range(len(data)):
-                out[idx] = self._decode_values(data[idx])
-        else:
-            out = data
+    def _encode_mapping(self, data):
+        """Encode all values of a dict.
+
+        The dict is only copied if some of its values are encoded.
+        Dicts of primitive values are returned without walking them.
+
+        """
+        if primitive_types.issuperset(map(type, data.values())):
+            return data
+        out = data
+        for key in data:
+            value = self._encode_values(data[key])
+            if value is not data[key]:
+                if out is data:
+                    out = dict(data)
+                out[key] = value
+        return out
+
+    def _encode_sequence(self, data):
+        """Encode all items of a list or tuple.
+
+        The list is only copied if some of its items are encoded.
+        Lists of primitive values are returned without walking them.
+
+        """
+        if primitive_types.issuperset(map(type, data)):
+            return data
+        out = data
+        for idx, item in enumerate(data):
+            value = self._encode_values(item)
+            if value is not item:
+                if out is data:
+                    out = list(data)
+                out[idx] = value
         return out
 
+    def _decode_values(self, data):
+        """Walk through data and decode special entries.
+
+        Messages only contain lists, dicts, and primitive values. Since
+        they are not used anywhere else, lists and dicts are decoded
+        in place. Instead of recursing, nested lists and dicts are
+        collected on a stack, which saves a function call per node.
+
+        """
+        root = [data]
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for key, item in (node.items() if type(node) is dict else enumerate(node)):
+                item_type = type(item)
+                if item_type is list:
+                    if item and type(item[0]) is str and item[0] in self._decoders:
+                        value = self._decode_special(item)
+                        if value is not item:
+                            node[key] = value
+                            continue
+                    stack.append(item)
+                elif item_type is dict:
+                    stack.append(item)
+        return root[0]
+
+    def _decode_special(self, data):
+        """Decode a special list, or return it unchanged."""
+        lengths, decoder = self._decoders[data[0]]
+        if len(data) in lengths:
+            return getattr(self, decoder)(data)
+        return data
+
     def _encode_matrix(self, data):
         """Encode a Numpy array as a special list.
 
         The matrix `np.array([[1, 2], [3, 4]], dtype='int32')` would
         be encoded as
-        `["__matrix__", "int32", [2, 2], "AQAAAAIAAAADAAAABAAAA==\n"]`
-
-        where `"int32"` is the data type, `[2, 2]` is the matrix shape
-        and `"AQAAAAIAAAADAAAABAAAA==\n"` is the base64-encoded matrix
-        content.
+        `["__matrix__", "int32", [2, 2], "AQAAAAIAAAADAAAABAAAA==\n", "C"]`
+
+        where `"int32"` is the data type, `[2, 2]` is the matrix shape,
+        `"AQAAAAIAAAADAAAABAAAA==\n"` is the base64-encoded matrix
+        content, and `"C"` is the memory order of the content (`"C"`
+        for row-major, `"F"` for column-major). Fortran-ordered arrays
+        are sent in column-major order, so neither Python nor Matlab
+        has to reorder them. Non-contiguous arrays have to be copied
+        anyway, and are copied to column-major order, which saves
+        Matlab from reordering them.
+
+        In Msgpack, the matrix content is sent as a separate frame of
+        the message instead, and the matrix is encoded as
+        `["__matrix__", "int32", [2, 2], ["__frame__", 1], "C"]`, where
+        `1` is the index of the frame within the multipart message. The
+        frame references the array memory, so the array must not be
+        changed until the message is sent.
+
+        If the remote runs on the same machine, matrices of at least
+        `_shm_threshold` bytes are copied to a block of shared memory
+        instead, and the matrix content is encoded as
+        `["__shm__", "psm_1a2b3c4d"]`, where `"psm_1a2b3c4d"` is the
+        name of the shared memory block in `/dev/shm`. This is cheaper
+        than sending them through a socket.
+
+        Matrices with a dtype in `_downcast` are converted to the
+        associated dtype first.
 
         """
 
-        if self.msgformat == 'json':
-            return ["__matrix__", data.dtype.name, data.shape,
-                    base64.b64encode(data.tostring()).decode()]
+        if data.dtype in self._downcast:
+            data = data.astype(self._downcast[data.dtype])
+        shape = data.shape
+        if data.flags.c_contiguous:
+            order = 'C'
+        elif data.flags.f_contiguous:
+            # the transpose is a row-major view of the same memory:
+            data, order = data.T, 'F'
+        else:
+            data, order = np.asfortranarray(data).T, 'F'
+        if self._shm_threshold is not None and data.nbytes >= self._shm_threshold:
+            shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+            self._shared_memory.append(shm)
+            np.ndarray(data.shape, data.dtype, buffer=shm.buf)[...] = data
+            return ["__matrix__", data.dtype.name, shape,
+                    ["__shm__", shm.name.lstrip('/')], order]
+        elif self.msgformat == 'json':
+            # encode the array memory directly, without a copy in between:
+            return ["__matrix__", data.dtype.name, shape,
+                    b64encode_as_string(np.ascontiguousarray(data)), order]
         else:
-            return ["__matrix__", data.dtype.name, data.shape,
-                    data.tobytes()]
+            self._frames.append(np.ascontiguousarray(data))
+            return ["__matrix__", data.dtype.name, shape,
+                    ["__frame__", len(self._frames)-1], order]
 
     def _decode_matrix(self, data):
         """Decode a special list to a Numpy array.
 
         The matrix `np.array([[1, 2], [3, 4]], dtype='int32')` would
         be encoded as
-        `["__matrix__", "int32", [2, 2], "AQAAAAIAAAADAAAABAAAA==\n"]`
+        `["__matrix__", "int32", [2, 2], "AQAAAAIAAAADAAAABAAAA==\n", "C"]`
 
-        where `"int32"` is the data type, `[2, 2]` is the matrix shape
-        and `"AQAAAAIAAAADAAAABAAAA==\n"` is the base64-encoded matrix
-        content.
+        where `"int32"` is the data type, `[2, 2]` is the matrix shape,
+        `"AQAAAAIAAAADAAAABAAAA==\n"` is the base64-encoded matrix
+        content, and `"C"` is the memory order of the content. In
+        Msgpack, the matrix content is either raw bytes, or a reference
+        `["__frame__", 1]` to a frame of the multipart message. If the
+        memory order is missing, it defaults to row-major (`"C"`).
+
+        Column-major (`"F"`) content, as sent by Matlab, is decoded as
+        a Fortran-ordered array without reordering.
+
+        Frame contents are used as array memory directly. Other
+        contents are immutable `bytes`, and decoded into a bytearray
+        instead, so that all returned arrays are writeable.
 
         """
 
-        dtype, shape, data = data[1:]
-        if isinstance(data, str):
-            out = np.fromstring(base64.b64decode(data.encode()), dtype)
+        dtype, shape, content = data[1:4]
+        order = data[4] if len(data) > 4 else 'C'
+        if isinstance(content, str):
+            out = np.frombuffer(b64decode_as_bytearray(content), dtype)
+        elif isinstance(content, list) and content[0] == "__frame__":
+            out = np.frombuffer(self._frames[int(content[1])].buffer, dtype)
         else:
-            out = np.frombuffer(data, dtype)
+            out = np.frombuffer(bytearray(content), dtype)
         shape = [int(n) for n in shape]; # numpy requires integer indices
-        return out.reshape(*shape)
+        return out.reshape(shape, order=order)
 
     def _encode_sparse_matrix(self, data):
         """Encode a scipy.sparse matrix as a special list.
@@ -294,12 +673,15 @@ class TransplantMaster:
           <matrix for values [2, 3]>]`,
         where each `<matrix>` is encoded according to `_encode_matrix`
         and `[2, 2]` is the data shape.
-        """
 
-        # import scipy here to avoid a global import
-        import scipy.sparse
+        The indices and values are taken from the COO representation
+        as they are, without sorting or summing duplicate entries
+        first. Matlab's `sparse` sums duplicates and drops zeros
+        anyway.
+        """
+        data = data.tocoo()
         return ["__sparse__", data.shape] + \
-            [self._encode_matrix(d) for d in scipy.sparse.find(data)]
+            [self._encode_matrix(d) for d in (data.row, data.col, data.data)]
 
     def _decode_sparse_matrix(self, data):
         """Decode a special list to a scipy.sparse matrix.
@@ -313,15 +695,15 @@ class TransplantMaster:
         would be decoded as `[[2, 0], [0, 3]]`.
         """
 
-        # import scipy here to avoid a global import
-        import scipy.sparse
+        if coo_matrix is None:
+            raise ImportError('scipy is needed to decode sparse matrices')
         # either decode as vector, or as [], since coo_matrix doesn't
         # know what to do with 2D-arrays or None.
         row, col, value = (self._decode_matrix(d).ravel()
                            if d is not None else []
                            for d in data[2:])
-        shape = (int(d) for d in data[1]) # convert shape to int
-        return scipy.sparse.coo_matrix((value, (row, col)), shape=shape)
+        shape = tuple(int(d) for d in data[1]) # convert shape to int
+        return coo_matrix((value, (row, col)), shape=shape)
 
     def _encode_proxy(self, data):
         """Encode a ProxyObject as a special list.
@@ -361,10 +743,33 @@ class MatlabProxyObject:
         """foo"""
         self.__dict__['handle'] = handle
         self.__dict__['process'] = process
+        # names of properties and methods, and the help text, fetched
+        # on first use:
+        self.__dict__['_properties'] = None
+        self.__dict__['_methods'] = None
+        self.__dict__['_help_text'] = None
+        self.__dict__['_classname'] = None
 
     def _getAttributeNames(self):
         return self.process.fieldnames(self)
 
+    def _class(self):
+        """Retrieve the class name of the object once."""
+        if self._classname is None:
+            self.__dict__['_classname'] = self.process.str2func('class')(self)
+        return self._classname
+
+    def _refresh(self):
+        """Forget the cached property and method names and help text.
+
+        Call this if properties or methods were added to the object in
+        Matlab, for example to a `dynamicprops` object.
+
+        """
+        self.__dict__['_properties'] = None
+        self.__dict__['_methods'] = None
+        self.__dict__['_help_text'] = None
+
     def __getattr__(self, name):
         """Retrieve a value or function from the object.
 
@@ -373,13 +778,20 @@ class MatlabProxyObject:
 
         Functions are returned as :class:`MatlabFunction` objects.
 
+        The names of properties and methods are only fetched once per
+        object (see `_refresh`).
+
         """
         m = self.process
         # if it's a property, just retrieve it
-        if name in m.properties(self, nargout=1):
+        if self._properties is None:
+            self.__dict__['_properties'] = frozenset(m.properties(self, nargout=1))
+        if name in self._properties:
             return m.subsref(self, MatlabStruct(m.substruct('.', name)))
         # if it's a method, wrap it in a functor
-        if name in m.methods(self, nargout=1):
+        if self._methods is None:
+            self.__dict__['_methods'] = frozenset(m.methods(self, nargout=1))
+        if name in self._methods:
             class matlab_method:
                 def __call__(_self, *args, nargout=-1, **kwargs):
                     # serialize keyword arguments:
@@ -389,8 +801,7 @@ class MatlabProxyObject:
                 # only fetch documentation when it is actually needed:
                 @property
                 def __doc__(_self):
-                    classname = getattr(m, 'class')(self)
-                    return m.help('{0}.{1}'.format(classname, name), nargout=1)
+                    return m._help('{0}.{1}'.format(self._class(), name))
             return matlab_method()
 
     def __setattr__(self, name, value):
@@ -398,8 +809,7 @@ class MatlabProxyObject:
         self.process.subsasgn(self, access, value)
 
     def __repr__(self):
-        getclass = self.process.str2func('class')
-        return "<proxy for Matlab {} object>".format(getclass(self))
+        return "<proxy for Matlab {} object>".format(self._class())
 
     def __str__(self):
         # remove pseudo-html tags from Matlab output
@@ -411,7 +821,9 @@ class MatlabProxyObject:
 
     @property
     def __doc__(self):
-        return self.process.help(self, nargout=1)
+        if self._help_text is None:
+            self.__dict__['_help_text'] = self.process.help(self, nargout=1)
+        return self._help_text
 
 
 class MatlabStruct(dict):
@@ -450,9 +862,27 @@ class MatlabFunction:
 
         """
         # serialize keyword arguments:
-        args += sum(kwargs.items(), ())
+        if kwargs:
+            args += tuple(item for pair in kwargs.items() for item in pair)
         return self._parent._call(self._fun, args, nargout=nargout)
 
+    def call_async(self, *args, nargout=-1, **kwargs):
+        """Call the Matlab function without waiting for it.
+
+        Takes the same arguments as calling the function directly, but
+        returns a :class:`concurrent.futures.Future` of the result
+        immediately. Python can do other work while Matlab is busy.
+        Matlab still executes one call at a time, in order. Use
+        ``await asyncio.wrap_future(future)`` in asyncio code.
+
+        Arrays must not be changed until the call has been sent.
+        Raises a `RuntimeError` within a `batch`.
+
+        """
+        if kwargs:
+            args += tuple(item for pair in kwargs.items() for item in pair)
+        return self._parent._call_async(self._fun, args, nargout=nargout)
+
 
 class Matlab(TransplantMaster):
     """An instance of Matlab, running in its own process.
@@ -503,13 +933,26 @@ class Matlab(TransplantMaster):
         Whether to start Matlab with ``-nodesktop``, defaults to ``True``.
     jvm : bool
         Whether to start Matlab with ``-nojvm``, defaults to ``False``.
+    downcast : dict
+        Convert matrices of some dtypes to other dtypes before sending
+        them to Matlab, e.g. ``{'float64': 'float32'}`` to send double
+        precision matrices at single precision, which halves their
+        size. ``'float16'`` and ``'bfloat16'`` (from ``ml_dtypes``)
+        matrices are converted to ``single`` in Matlab. Defaults to
+        no conversion.
 
     """
 
     ProxyObject = MatlabProxyObject
+    # path to libzmq, found by `_locate_libzmq`:
+    _libzmq = None
 
-    def __init__(self, executable='matlab', arguments=tuple(), msgformat='msgpack', address=None, user=None, print_to_stdout=True, desktop=False, jvm=True):
+    def __init__(self, executable='matlab', arguments=tuple(), msgformat='msgpack', address=None, user=None, print_to_stdout=True, desktop=False, jvm=True, downcast=None):
         """Starts a Matlab instance and opens a communication channel."""
+        # functions and packages retrieved by `__getattr__`, by name:
+        self._functions = {}
+        # their help texts, by name:
+        self._help_texts = {}
         if msgformat not in ['msgpack', 'json']:
             raise ValueError('msgformat must be "msgpack" or "json"')
 
@@ -558,10 +1001,28 @@ class Matlab(TransplantMaster):
         if sys.platform == 'win32' or sys.platform == 'cygwin':
             process_arguments += ['-wait']
         self.msgformat = msgformat
+        self._downcast = {np.dtype(source): np.dtype(target)
+                          for source, target in (downcast or {}).items()}
+        # reuse one encoder (and its buffer) for all messages:
+        if msgspec is not None:
+            self._pack = msgspec.msgpack.Encoder().encode
+            self._unpack = msgspec.msgpack.Decoder().decode
+        else:
+            self._pack = msgpack.Packer(use_bin_type=True).pack
+            self._unpack = partial(msgpack.unpackb, raw=False, max_bin_len=2**31-1)
+        # Matlab can only map shared memory if it runs on the same
+        # machine, and finds it as a file in /dev/shm:
+        if address is None and sys.platform == 'linux' and shared_memory is not None:
+            self._shm_threshold = 2**20
         # Create a new ZMQ context instead of sharing the global ZMQ context.
         # We now have ownership of it, and can terminate it with impunity.
         self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
+        # A DEALER socket does not enforce strict send/receive
+        # alternation like REQ, so an interrupted request does not
+        # leave the socket in an unusable state (see `send_message`):
+        self.socket = self.context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.setsockopt(zmq.RCVTIMEO, 1000)
         self.socket.bind(zmq_address)
         # start Matlab, but make sure that it won't eat the REPL stdin
         # (stdin=DEVNULL).
@@ -573,29 +1034,61 @@ class Matlab(TransplantMaster):
     def exit(self):
         """Close the connection, and kill the process."""
         super().exit()
+        if self._executor is not None:
+            self._executor.shutdown()
         self.socket.close()
         self.context.term()
 
+    def _set_global(self, name, value):
+        """Save a value as a named variable."""
+        # the variable shadows any function of the same name:
+        self._functions.pop(name, None)
+        super()._set_global(name, value)
+
+    def invalidate(self, name=None):
+        """Forget cached functions and packages.
+
+        Functions and packages are only retrieved from Matlab once, and
+        are cached afterwards, as are their help texts. If a name is
+        re-bound in Matlab (e.g. by a variable created in `eval`, or a
+        changed path), the cache has to be invalidated for the new
+        value to be found. Without `name`, the whole cache is cleared.
+
+        """
+        if name is None:
+            self._functions.clear()
+            self._help_texts.clear()
+        else:
+            self._functions.pop(name, None)
+            self._help_texts.pop(name, None)
+
+    def _help(self, name):
+        """Retrieve the help text of a function or package once."""
+        if name not in self._help_texts:
+            self._help_texts[name] = self.help(name, nargout=1)
+        return self._help_texts[name]
+
     def _call(self, name, args, nargout=-1):
         """Call a function on the remote."""
-        args = list(args)
         try:
             response = self.send_message('call', name=name, args=args,
                                          nargout=nargout)
         except KeyboardInterrupt as exc:
-            # hand the interrupt down to Matlab:
+            # hand the interrupt down to Matlab. Its outstanding
+            # response will be discarded by the next `send_message`:
             self.process.send_signal(SIGINT)
-            # receive outstanding message to get ZMQ back in the right state
-            if self.msgformat == 'msgpack':
-                response = msgpack.unpackb(self.socket.recv(), raw=False, max_bin_len=2**31-1)
-            else:
-                response = self.socket.recv_json()
             # continue with the exception
             raise exc
 
         if response['type'] == 'value':
             return response['value']
 
+    def _call_async(self, name, args, nargout=-1):
+        """Call a function on the remote in the background."""
+        self._check_not_batching()
+        self._start_executor()
+        return self._executor.submit(self._call, name, args, nargout)
+
     def _decode_function(self, data):
         """Decode a special list to a wrapper function."""
 
@@ -618,7 +1111,7 @@ class Matlab(TransplantMaster):
             # only fetch documentation when it is actually needed:
             @classproperty
             def __doc__(_self):
-                return self.help(data[1], nargout=1)
+                return self._help(data[1])
 
         return ThisFunc(self, data[1])
 
@@ -630,11 +1123,19 @@ class Matlab(TransplantMaster):
         :class:`MatlabProxyObject` objects.
 
         Functions are returned as :class:`MatlabFunction` objects.
+        Functions and packages are cached, and are only retrieved
+        once (see `invalidate`). Variables are not cached, not even
+        if they contain function handles.
 
         """
 
+        # not set yet, e.g. if the constructor failed:
+        if name in self._attributes:
+            raise AttributeError(name)
+        if name in self._functions:
+            return self._functions[name]
         try:
-            return self._get_global(name)
+            value = self._get_global(name)
         except TransplantError as err:
             # package identifiers for `what` use '/' instead of '.':
             packagedict = self.what(name.replace('.', '/'))
@@ -648,8 +1149,15 @@ class Matlab(TransplantMaster):
                         return "<MatlabPackage {}>".format(name)
                     @property
                     def __doc__(_self):
-                        return self.help(name, nargout=1)
-                return MatlabPackage()
+                        return self._help(name)
+                value = MatlabPackage()
+                self._functions[name] = value
+                return value
+        # a function handle variable is named differently than the
+        # function it refers to (e.g. 'f' for '@(x)x+1'):
+        if isinstance(value, MatlabFunction) and value._fun == name:
+            self._functions[name] = value
+        return value
 
     def _locate_libzmq(self):
         """Find the full path to libzmq.
@@ -661,7 +1169,16 @@ class Matlab(TransplantMaster):
         directories such as a conda installation or the ZMQ Windows
         installer.
 
+        The search is only done once, and its result is reused for all
+        further Matlab instances.
+
         """
+        if Matlab._libzmq is None:
+            Matlab._libzmq = self._search_libzmq()
+        return Matlab._libzmq
+
+    def _search_libzmq(self):
+        """Search the file system for libzmq (see `_locate_libzmq`)."""
 
         if sys.platform == 'linux' or sys.platform == 'darwin':
             libzmq = ctypes.util.find_library('zmq')
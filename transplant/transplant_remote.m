@@ -2,8 +2,8 @@
 % TRANSPLANT(URL) connects to a 0MQ client at a given URL.
 %
 %    The client can send messages, which TRANSPLANT will answer.
-%    All messages are JSON-encoded strings. All message are structures
-%    with at least one key: 'type'
+%    All messages are Msgpack-encoded or JSON-encoded objects. All
+%    message are structures with at least one key: 'type'
 %
 %    Depending on the message type, other keys may or may not be set.
 %
@@ -13,6 +13,8 @@
 %    - 'get_global': retrieve the value of a global variable 'name'.
 %    - 'del_proxy': remove cached object 'handle'.
 %    - 'call': call function 'name' with 'args' and 'nargout'.
+%    - 'batch': handle all 'messages' in order, and return their
+%      responses as a list. The first error aborts the batch.
 %
 %    TRANSPLANT implements the following responses:
 %    - 'ack': received message successfully.
@@ -24,6 +26,11 @@
 %    - Matrices are encoded as {"__matrix__", ... }
 %    - Functions are encoded as {"__function__", str2func(f) }
 %    - Objects are encoded as {"__object__", handle }
+%
+%    In Msgpack, matrix contents are sent as additional frames of a
+%    multipart message, and referenced as {"__frame__", index }.
+%    Big matrices from a local Python are passed in shared memory, and
+%    referenced as {"__shm__", name } of a file in /dev/shm.
 
 % (c) 2014 Bastian Bechtold
 
@@ -31,6 +38,11 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
     % this must be persistent to survive a SIGINT:
     persistent proxied_objects is_receiving should_die messenger
 
+    % matrix contents of the current message, see encode_matrix:
+    frames = {};
+    % responses of the current batch of messages, or [] if there is none:
+    batch_responses = [];
+
     % since the onCleanup prevents direct exit, quit here after revival before
     % a new onCleanup is created:
     if should_die
@@ -71,80 +83,97 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
             msg = receive_msg();
             is_receiving = false;
             msg = decode_values(msg);
-            switch msg('type')
-                case 'die' % exit matlab
-                    send_ack();
-                    should_die = true;
-                    % At this point, we can't just quit, since onCleanup *will*
-                    % revive us as a zombie. Instead, we mark ourselves as
-                    % suicidial, and return. This will quit Matlab directly
-                    % after revival, before the next onCleanup is created.
-                    return
-                case 'set_global' % save msg.value as a global variable
-                    assignin('base', msg('name'), msg('value'));
-                    send_ack();
-                case 'get_global' % retrieve the value of a global variable
-                    % simply evalin('base', msg.name) would call functions,
-                    % so that can't be used.
-                    existance = evalin('base', ['exist(''' msg('name') ''')']);
-                    % exist doesn't find methods, though.
-                    % exist returns 0 if the name does not exist and 7 if it is
-                    % a folder, which we are not interested in.
-                    existance = ~any(existance == [0, 7]) | any(which(msg('name')));
-                    % value does not exist:
-                    if ~existance
-                        error('TRANSPLANT:novariable' , ...
-                              ['Undefined variable ''' msg('name') '''.']);
-                    % value is a function or method:
-                    elseif any(existance == [2, 3, 5, 6]) | any(which(msg('name')))
-                        value = str2func(msg('name'));
-                    else
-                        value = evalin('base', msg('name'));
-                    end
-                    send_value(value);
-                case 'del_proxy' % invalidate cached object
-                    proxied_objects{msg('handle')} = [];
-                    send_ack();
-                case 'call' % call a function
-                    fun = str2func(msg('name'));
+            if strcmp(msg('type'), 'batch')
+                % handle several messages at once, and collect their
+                % responses in batch_responses (see send_message):
+                messages = msg('messages');
+                batch_responses = {};
+            else
+                messages = {msg};
+            end
+            for msg_idx=1:numel(messages)
+                msg = messages{msg_idx};
+                switch msg('type')
+                    case 'die' % exit matlab
+                        send_ack();
+                        should_die = true;
+                        % At this point, we can't just quit, since onCleanup *will*
+                        % revive us as a zombie. Instead, we mark ourselves as
+                        % suicidial, and return. This will quit Matlab directly
+                        % after revival, before the next onCleanup is created.
+                        return
+                    case 'set_global' % save msg.value as a global variable
+                        assignin('base', msg('name'), msg('value'));
+                        send_ack();
+                    case 'get_global' % retrieve the value of a global variable
+                        % simply evalin('base', msg.name) would call functions,
+                        % so that can't be used.
+                        existance = evalin('base', ['exist(''' msg('name') ''')']);
+                        % exist doesn't find methods, though.
+                        % exist returns 0 if the name does not exist and 7 if it is
+                        % a folder, which we are not interested in.
+                        existance = ~any(existance == [0, 7]) | any(which(msg('name')));
+                        % value does not exist:
+                        if ~existance
+                            error('TRANSPLANT:novariable' , ...
+                                  ['Undefined variable ''' msg('name') '''.']);
+                        % value is a function or method:
+                        elseif any(existance == [2, 3, 5, 6]) | any(which(msg('name')))
+                            value = str2func(msg('name'));
+                        else
+                            value = evalin('base', msg('name'));
+                        end
+                        send_value(value);
+                    case 'del_proxy' % invalidate cached object
+                        proxied_objects{msg('handle')} = [];
+                        send_ack();
+                    case 'call' % call a function
+                        fun = str2func(msg('name'));
 
-                    % get the number of output arguments
-                    if isKey(msg, 'nargout') && msg('nargout') >= 0
-                        resultsize = msg('nargout');
-                    else
-                        try
-                            resultsize = nargout(fun);
-                        catch % nargout fails if fun is a method:
+                        % get the number of output arguments
+                        if isKey(msg, 'nargout') && msg('nargout') >= 0
+                            resultsize = msg('nargout');
+                        else
                             try
-                                resultsize = nargout(msg('name'));
-                            catch
-                                resultsize = -1;
+                                resultsize = nargout(fun);
+                            catch % nargout fails if fun is a method:
+                                try
+                                    resultsize = nargout(msg('name'));
+                                catch
+                                    resultsize = -1;
+                                end
                             end
                         end
-                    end
 
-                    if resultsize > 0
-                        % call the function with the given number of
-                        % output arguments:
-                        results = cell(resultsize, 1);
-                        args = msg('args');
-                        [results{:}] = fun(args{:});
-                        if length(results) == 1
-                            send_value(results{1});
+                        if resultsize > 0
+                            % call the function with the given number of
+                            % output arguments:
+                            results = cell(resultsize, 1);
+                            args = msg('args');
+                            [results{:}] = fun(args{:});
+                            if length(results) == 1
+                                send_value(results{1});
+                            else
+                                send_value(results);
+                            end
                         else
-                            send_value(results);
-                        end
-                    else
-                        % try to get output from ans:
-                        clear('ans');
-                        args = msg('args');
-                        fun(args{:});
-                        try
-                            send_value(ans);
-                        catch err
-                            send_ack();
+                            % try to get output from ans:
+                            clear('ans');
+                            args = msg('args');
+                            fun(args{:});
+                            try
+                                send_value(ans);
+                            catch err
+                                send_ack();
+                            end
                         end
-                    end
+                end
+            end
+            if iscell(batch_responses)
+                message = containers.Map();
+                message('value') = batch_responses;
+                batch_responses = [];
+                send_message('value', message);
             end
         catch err
             send_error(err)
@@ -156,12 +185,19 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
     % This is the base function for the specialized senders below
     function send_message(message_type, message)
         message('type') = message_type;
+        if iscell(batch_responses)
+            % responses of a batch are sent together, once the batch is
+            % done. Their matrix contents remain in frames until then.
+            batch_responses{end+1} = message;
+            return
+        end
         if strcmp(msgformat, 'msgpack')
-            messenger.send(dumpmsgpack(message));
+            messenger.send([{dumpmsgpack(message)}, frames]);
         else
             str = dumpjson(message);
             messenger.send(unicode2native(str, 'utf-8'));
         end
+        frames = {};
     end
 
     % Send an acknowledgement message
@@ -171,6 +207,10 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
 
     % Send an error message
     function send_error(err)
+        % discard frames of a partially encoded value, and abort any
+        % batch in progress:
+        frames = {};
+        batch_responses = [];
         message = containers.Map();
         message('identifier') = err.identifier;
         message('message') = err.message;
@@ -194,9 +234,13 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
 
     % Wait for and receive a message
     function message = receive_msg()
-        blob = messenger.receive();
+        parts = messenger.receive();
+        blob = parts{1};
         if strcmp(msgformat, 'msgpack')
+            % matrix contents are sent as additional frames:
+            frames = parts(2:end);
             message = decode_values(parsemsgpack(blob));
+            frames = {};
         else
             str = native2unicode(blob, 'utf-8');
             message = decode_values(parsejson(str));
@@ -246,7 +290,7 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
         if iscell(value)
             len = numel(value);
             special = len > 0 && ischar(value{1});
-            if special && len == 4 && strcmp(value{1}, '__matrix__')
+            if special && any(len == [4 5]) && strcmp(value{1}, '__matrix__')
                 value = decode_matrix(value);
             elseif special && len == 5 && strcmp(value{1}, '__sparse__')
                 value = decode_sparse_matrix(value);
@@ -305,16 +349,19 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
     end
 
     % The matrix `int32([1 2; 3 4])` would be encoded as
-    % `{'__matrix__', 'int32', [2, 2], 'AQAAAAIAAAADAAAABAAAA==\n'}`
+    % `{'__matrix__', 'int32', [2, 2], 'AQAAAAMAAAACAAAABAAAAA==', 'F'}`
     %
-    % where `'int32'` is the data type, `[2, 2]` is the matrix shape and
-    % `'AQAAAAIAAAADAAAABAAAA==\n"'` is the base64-encoded matrix content.
+    % where `'int32'` is the data type, `[2, 2]` is the matrix shape,
+    % `'AQAAAAMAAAACAAAABAAAAA=='` is the base64-encoded matrix content,
+    % and `'F'` marks the content as column-major (Matlab, FORTRAN), which
+    % Python can read without reordering.
+    %
+    % In Msgpack, the matrix content is appended to the frames of the
+    % message instead, and encoded as `{'__frame__', index}`.
     function [value] = encode_matrix(value)
         if ~isreal(value) && isinteger(value)
             value = double(value); % Numpy does not know complex int
         end
-        % convert column-major (Matlab, FORTRAN) to row-major (C, Python)
-        value = permute(value, length(size(value)):-1:1);
         % convert to uint8 1-D array
         if isreal(value)
             if islogical(value)
@@ -333,12 +380,6 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
             tmp(2:2:end) = imag(value(:));
             binary = typecast(tmp, 'uint8');
         end
-        % not all typecasts return column vectors, so use (:)
-        if strcmp(msgformat, 'json')
-            binary = base64encode(binary(:));
-        else
-            binary = binary(:);
-        end
         % translate Matlab class names into numpy dtypes
         if isa(value, 'double') && isreal(value)
             dtype = 'float64';
@@ -355,17 +396,32 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
         else
             return % don't encode
         end
-        % save as row-major (C, Python)
-        value = {'__matrix__', dtype, fliplr(size(value)), binary};
+        % not all typecasts return column vectors, so use (:)
+        if strcmp(msgformat, 'json')
+            binary = base64encode(binary(:));
+        else
+            % frame indexes count the message itself as frame 0:
+            frames{end+1} = binary(:);
+            binary = {'__frame__', int32(numel(frames))};
+        end
+        % save as column-major (Matlab, FORTRAN)
+        value = {'__matrix__', dtype, size(value), binary, 'F'};
     end
 
     % The matrix `int32([1 2; 3 4])` would be encoded as
-    % `{'__matrix__', 'int32', [2, 2], 'AQAAAAIAAAADAAAABAAAA==\n'}`
+    % `{'__matrix__', 'int32', [2, 2], 'AQAAAAIAAAADAAAABAAAA==\n', 'C'}`
     %
-    % where `'int32'` is the data type, `[2, 2]` is the matrix shape and
-    % `'AQAAAAIAAAADAAAABAAAA==\n'` is the base64-encoded matrix content.
+    % where `'int32'` is the data type, `[2, 2]` is the matrix shape,
+    % `'AQAAAAIAAAADAAAABAAAA==\n'` is the base64-encoded matrix content,
+    % and `'C'` is the memory order of the content (`'C'` for row-major,
+    % `'F'` for column-major). A missing memory order means row-major.
     function [value] = decode_matrix(value)
         dtype = value{2};
+        if numel(value) == 5
+            order = value{5};
+        else
+            order = 'C';
+        end
         % make sure shape is a double array even if its elements are
         % less than double:
         shape = cellfun(@double, value{3});
@@ -376,6 +432,13 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
         end
         if ischar(value{4})
             binary = base64decode(value{4});
+        elseif iscell(value{4}) && strcmp(value{4}{1}, '__shm__')
+            % {'__shm__', name} of a shared memory block. Read it before
+            % Python releases it after our response:
+            shm = memmapfile(['/dev/shm/' value{4}{2}], 'Format', 'uint8');
+            binary = shm.Data;
+        elseif iscell(value{4}) % {'__frame__', index}
+            binary = frames{double(value{4}{2})};
         else
             binary = value{4};
         end
@@ -390,14 +453,27 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
             value = value(1:2:end) + 1i*value(2:2:end);
         elseif strcmp(dtype, 'float32')
             value = typecast(binary, 'single')';
+        elseif strcmp(dtype, 'float16')
+            value = half2single(typecast(binary, 'uint16'))';
+        elseif strcmp(dtype, 'bfloat16')
+            % bfloat16 is the upper half of a single, so pad each value
+            % with a zero lower half:
+            halves = zeros(2, numel(binary)/2, 'uint16');
+            halves(2,:) = typecast(binary, 'uint16');
+            value = typecast(halves(:), 'single')';
         elseif strcmp(dtype, 'bool')
             value = logical(binary);
         else
             value = typecast(binary, dtype);
         end
-        % convert row-major (C, Python) to column-major (Matlab, FORTRAN)
-        value = reshape(value, fliplr(shape));
-        value = permute(value, length(shape):-1:1);
+        if strcmp(order, 'F')
+            % column-major (Matlab, FORTRAN) needs no conversion
+            value = reshape(value, shape);
+        else
+            % convert row-major (C, Python) to column-major (Matlab, FORTRAN)
+            value = reshape(value, fliplr(shape));
+            value = permute(value, length(shape):-1:1);
+        end
     end
 
     % Encode a sparse matrix as a special list.
@@ -420,6 +496,25 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
         end
     end
 
+    % Convert IEEE half precision bit patterns to single precision
+    %
+    % Matlab has no half precision type, so this decodes sign, exponent
+    % and mantissa by hand.
+    function [value] = half2single(bits)
+        bits = double(bits);
+        sgn = 1 - 2*floor(bits/32768);
+        expo = mod(floor(bits/1024), 32);
+        mant = mod(bits, 1024);
+        value = sgn .* pow2(1 + mant/1024, expo - 15);
+        % subnormal numbers and zero:
+        subnormal = expo == 0;
+        value(subnormal) = sgn(subnormal) .* pow2(mant(subnormal)/1024, -14);
+        % infinity and NaN:
+        value(expo == 31 & mant == 0) = sgn(expo == 31 & mant == 0) * Inf;
+        value(expo == 31 & mant ~= 0) = NaN;
+        value = single(value);
+    end
+
     % Decode a special list to a sparse matrix.
     % A sparse matrix
     % `["__sparse__", [2, 2],
@@ -427,7 +522,7 @@ function transplant_remote(msgformat, url, zmqname, is_zombie)
     %   <matrix for row indices [1, 0]>,
     %   <matrix for values [2, 3]>]`,
     % where each `<matrix>` is encoded according `encode_matrix` would be
-    % decoded as `[[2, 0], [0, 3]]`.
+    % decoded as `[[2, 0], [0, 3]]`. Duplicate entries are summed.
     function [value] = decode_sparse_matrix(value)
         % make sure shape is a double array even if its elements are
         % less than double:
@@ -1,24 +1,51 @@
 import sys
+import json
 import types
 import traceback
-from collections import deque
 import zmq
 import numpy as np
-import base64
+
+try:
+    # orjson parses JSON much faster than json:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # pybase64 is a faster drop-in replacement for base64:
+    import pybase64 as base64
+    b64encode_as_string = base64.b64encode_as_string
+    b64decode_as_bytearray = base64.b64decode_as_bytearray
+except ImportError:
+    import base64
+    def b64encode_as_string(s):
+        return base64.b64encode(s).decode()
+    def b64decode_as_bytearray(s):
+        return bytearray(base64.b64decode(s))
+
+primitive_types = frozenset([str, bytes, int, float, bool, type(None)])
 
 class TransplantClient:
 
+    # special lists by tag, with their lengths and decoder method:
+    decoders = {"__matrix__": ((4, 5), 'decode_matrix'),
+                "__object__": ((2,), 'decode_proxy'),
+                "__function__": ((2,), 'decode_function')}
+
     def __init__(self, url):
-        self.context = zmq.Context()
+        self.context = zmq.Context.instance()
         self.socket = self.context.socket(zmq.REP)
+        # don't hang on exit if the master is gone:
+        self.socket.setsockopt(zmq.LINGER, 0)
         self.socket.connect(url)
         self.object_cache = []
-        self.empty_cache_indexes = deque()
+        # freed cache indexes, reused last-in first-out:
+        self.empty_cache_indexes = []
 
     def message_loop(self):
         """Main messaging loop."""
         while True:
-            msg = self.decode_values(self.socket.recv_json())
+            msg = self.receive_msg()
             print('received', msg)
             try:
                 if msg['type'] == 'die': # exit python
@@ -100,22 +127,40 @@ class TransplantClient:
 
     def receive_msg(self):
         """Wait for and receive a message."""
-        return self.decode_values(zmq.recv())
+        if orjson is None:
+            return self.decode_values(self.socket.recv_json())
+        message = self.socket.recv()
+        try:
+            return self.decode_values(orjson.loads(message))
+        except orjson.JSONDecodeError:
+            # only json accepts a bare `NaN`:
+            return self.decode_values(json.loads(message.decode()))
 
     def encode_values(self, data):
         """Recursively walk through data and encode special entries."""
-        if isinstance(data, (str, bytes, float, int, bool)) or data is None:
+        # exact type checks are much faster than `isinstance`, so the
+        # most common types are checked that way first:
+        data_type = type(data)
+        if data_type in primitive_types:
+            return data
+        elif data_type is np.ndarray:
+            return self.encode_matrix(data)
+        elif isinstance(data, (str, bytes, float, int, bool)):
             return data
         elif isinstance(data, np.ndarray):
             return self.encode_matrix(data)
         elif isinstance(data, (types.FunctionType, types.BuiltinFunctionType)):
             return self.encode_function(data)
         elif isinstance(data, dict):
+            if primitive_types.issuperset(map(type, data.values())):
+                return data
             out = {}
             for key in data:
                 out[key] = self.encode_values(data[key])
             return out
         elif isinstance(data, list) or isinstance(data, tuple):
+            if primitive_types.issuperset(map(type, data)):
+                return data
             out = list(data)
             for idx in range(len(data)):
                 out[idx] = self.encode_values(data[idx])
@@ -124,30 +169,26 @@ class TransplantClient:
             return self.encode_proxy(data)
 
     def decode_values(self, data):
-        """Recursively walk through data and decode special entries."""
-        if (isinstance(data, list) and
-            len(data) == 4 and
-            data[0] == "__matrix__"):
-            return self.decode_matrix(data)
-        elif (isinstance(data, list) and
-              len(data) == 2 and
-              data[0] == "__object__"):
-            return self.decode_proxy(data)
-        elif (isinstance(data, list) and
-              len(data) == 2 and
-              data[0] == "__function__"):
-            return self.decode_function(data)
-        elif isinstance(data, dict):
-            out = {}
-            for key in data:
-                out[key] = self.decode_values(data[key])
-        elif isinstance(data, list) or isinstance(data, tuple):
-            out = list(data)
-            for idx in range(len(data)):
-                out[idx] = self.decode_values(data[idx])
+        """Recursively walk through data and decode special entries.
+
+        Messages only contain lists, dicts, and primitive values.
+
+        """
+        data_type = type(data)
+        if data_type is list:
+            if data and type(data[0]) is str and data[0] in self.decoders:
+                lengths, decoder = self.decoders[data[0]]
+                if len(data) in lengths:
+                    return getattr(self, decoder)(data)
+            if primitive_types.issuperset(map(type, data)):
+                return data
+            return [self.decode_values(item) for item in data]
+        elif data_type is dict:
+            if primitive_types.issuperset(map(type, data.values())):
+                return data
+            return {key: self.decode_values(data[key]) for key in data}
         else:
-            out = data
-        return out
+            return data
 
     def encode_proxy(self, data):
         """Encode a ProxyObject as a special list.
@@ -156,13 +197,7 @@ class TransplantClient:
         `["__object__", 42]`
 
         """
-        if len(self.empty_cache_indexes) > 0:
-            idx = self.empty_cache_indexes.popleft()
-            self.object_cache[idx] = data
-        else:
-            idx = len(self.object_cache)
-            self.object_cache.append(data)
-        return ["__object__", idx]
+        return ["__object__", self.cache_object(data)]
 
     def decode_proxy(self, data):
         """Decode a special list to a ProxyObject.
@@ -174,13 +209,21 @@ class TransplantClient:
         return self.object_cache[data[1]]
 
     def encode_function(self, func):
-        if len(self.empty_cache_indexes) > 0:
-            idx = self.empty_cache_indexes.popleft()
-            self.object_cache[idx] = func
+        return ["__function__", self.cache_object(func)]
+
+    def cache_object(self, obj):
+        """Store an object in the object cache, and return its index.
+
+        The most recently freed index is reused first.
+
+        """
+        if self.empty_cache_indexes:
+            idx = self.empty_cache_indexes.pop()
+            self.object_cache[idx] = obj
         else:
             idx = len(self.object_cache)
-            self.object_cache.append(func)
-        return ["__function__", idx]
+            self.object_cache.append(obj)
+        return idx
 
     def decode_function(self, data):
         """Decode a special list to a wrapper function."""
@@ -200,8 +243,9 @@ class TransplantClient:
 
         """
 
+        # encode the array memory directly, without a copy in between:
         return ["__matrix__", data.dtype.name, data.shape,
-                base64.encodebytes(data.tostring()).decode()]
+                b64encode_as_string(np.ascontiguousarray(data))]
 
     def decode_matrix(self, data):
         """Decode a special list to a Numpy array.
@@ -212,13 +256,15 @@ class TransplantClient:
 
         where `"int32"` is the data type, `[2, 2]` is the matrix shape and
         `"AQAAAAIAAAADAAAABAAAA==\n"` is the base64-encoded matrix
-        content.
+        content. An optional fifth entry gives the memory order of the
+        content, `"C"` (the default) or `"F"`.
 
         """
 
-        dtype, shape, data = data[1:]
-        out = np.fromstring(base64.decodebytes(data.encode()), dtype)
-        return out.reshape(*shape)
+        dtype, shape, content = data[1:4]
+        order = data[4] if len(data) > 4 else 'C'
+        out = np.frombuffer(b64decode_as_bytearray(content), dtype)
+        return out.reshape(shape, order=order)
 
 if __name__ == "__main__":
     _client = TransplantClient(sys.argv[1])
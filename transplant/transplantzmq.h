@@ -18,6 +18,7 @@ int zmq_msg_init (zmq_msg_t *msg);
 int zmq_msg_send (zmq_msg_t *msg, void *s, int flags);
 int zmq_msg_recv (zmq_msg_t *msg, void *s, int flags);
 int zmq_msg_close (zmq_msg_t *msg);
+int zmq_msg_more (zmq_msg_t *msg);
 void *zmq_msg_data (zmq_msg_t *msg);
 
 void *zmq_socket (void *, int type);
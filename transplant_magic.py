@@ -1,3 +1,4 @@
+from types import ModuleType
 from IPython.core.magic import Magics, magics_class
 from IPython.core.magic import line_magic, line_cell_magic
 
@@ -22,19 +23,36 @@ class MatlabMagic(Magics):
         self.m = transplant.Matlab()
 
     def _shell_user_globals_to_matlab_base_workspace(self):
-        for name, value in self.shell.user_global_ns.items():
-            if not name.startswith('_'):
-                try:
+        import transplant
+        # skip names defined by IPython (e.g. `exit`, `get_ipython`),
+        # modules, and Python functions and classes, which can't be
+        # sent and would make the whole batch fail:
+        hidden = self.shell.user_ns_hidden
+        variables = [(name, value) for name, value in self.shell.user_global_ns.items()
+                     if not name.startswith('_') and name not in hidden and
+                     not isinstance(value, ModuleType) and
+                     (not callable(value) or isinstance(value, transplant.MatlabFunction))]
+        # send all variables in one round-trip:
+        try:
+            with self.m.batch():
+                for name, value in variables:
                     setattr(self.m, name, value)
-                except TypeError:
-                    pass
-        
+            return
+        except TypeError:
+            pass
+        # some values can't be sent. Send them one by one, and skip those:
+        for name, value in variables:
+            try:
+                setattr(self.m, name, value)
+            except TypeError:
+                pass
+
     def _matlab_base_workspace_to_shell_user_globals(self):
-        vars = self.m.evalin('base', 'who()', nargout=1)
-        for var in vars:
-            varname = str(var)
-            value = getattr(self.m, varname)
-            self.shell.user_global_ns[varname] = value
+        varnames = [str(var) for var in self.m.evalin('base', 'who()', nargout=1)]
+        if not varnames:
+            return
+        values = self.m.get_many(*varnames)
+        self.shell.user_global_ns.update(zip(varnames, values))
 
     @line_cell_magic
     def matlab(self, line, cell=None):